@@ -2,9 +2,12 @@
 import os
 os.environ["TK_SILENCE_DEPRECATION"] = "1"  # hide macOS Tk banner
 
+import io
 import subprocess
 import sys
 import threading
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
 from pathlib import Path
 from typing import Optional
 
@@ -61,7 +64,7 @@ def show_progress_window(start_text="Extracting comments…"):
     return win, label, bar
 
 # ---------- main ----------
-def run_extractor(input_path: Path, output_path: Path) -> subprocess.CompletedProcess:
+def run_extractor_subprocess(input_path: Path, output_path: Path) -> subprocess.CompletedProcess:
     cmd = [
         sys.executable, "-m", "src.extract_docx_comments",
         str(input_path), "-o", str(output_path),
@@ -69,6 +72,31 @@ def run_extractor(input_path: Path, output_path: Path) -> subprocess.CompletedPr
     ]
     return subprocess.run(cmd, capture_output=True, text=True, check=False)
 
+def run_extractor(input_path: Path, output_path: Path) -> Optional[str]:
+    """
+    Run the extractor in this process; return failure details, or None on success.
+    Falls back to a subprocess if the extractor module can't be imported here.
+    """
+    try:
+        from src.extract_docx_comments import extract_pairs, write_xlsx
+    except ImportError:
+        r = run_extractor_subprocess(input_path, output_path)
+        if r.returncode == 0:
+            return None
+        return f"Stdout:\n{r.stdout.strip()}\n\nStderr:\n{r.stderr.strip()}"
+
+    out = io.StringIO()
+    try:
+        with redirect_stdout(out), redirect_stderr(out):
+            rows = extract_pairs(input_path)
+            write_xlsx(rows, output_path, author=True, date=True)
+    except Exception:
+        details = out.getvalue().strip()
+        if details:
+            details += "\n\n"
+        return details + traceback.format_exc().strip()
+    return None
+
 def main():
     # 1) input from drag&drop, else picker
     input_path: Optional[Path] = None
@@ -93,27 +121,29 @@ def main():
         from tkinter import ttk  # noqa: F401  (ensures ttk available)
         win, label, bar = show_progress_window()
 
-        result_holder = {"result": None, "done": False}
+        result_holder = {"error": None, "done": False}
 
         def worker():
-            result_holder["result"] = run_extractor(input_path, output_path)
+            try:
+                result_holder["error"] = run_extractor(input_path, output_path)
+            except Exception:
+                result_holder["error"] = traceback.format_exc().strip()
             result_holder["done"] = True
 
         th = threading.Thread(target=worker, daemon=True)
         th.start()
 
+        # start snappy for small docs, then back off so long runs don't keep waking Tk
+        poll_interval = 120
+
         def poll():
+            nonlocal poll_interval
             if result_holder["done"]:
                 bar.stop()
                 win.destroy()
-                r = result_holder["result"]
-                if r is None or r.returncode != 0:
-                    stdout = (r.stdout if r else "").strip()
-                    stderr = (r.stderr if r else "").strip()
-                    msg = "Extractor failed."
-                    if stdout: msg += f"\n\nStdout:\n{stdout}"
-                    if stderr: msg += f"\n\nStderr:\n{stderr}"
-                    mac_dialog("CommentHarvest – Error", msg)
+                error = result_holder["error"]
+                if error:
+                    mac_dialog("CommentHarvest – Error", f"Extractor failed.\n\n{error}")
                     return
                 try:
                     subprocess.run(["open", str(output_path)], check=False)
@@ -121,17 +151,17 @@ def main():
                     mac_dialog("CommentHarvest",
                                f"Export complete ✅\n\nSaved to:\n{output_path}")
             else:
-                win.after(120, poll)
+                poll_interval = min(poll_interval + 40, 500)
+                win.after(poll_interval, poll)
 
-        win.after(120, poll)
+        win.after(poll_interval, poll)
         win.mainloop()
 
     except Exception:
         # Fallback: run without progress UI
-        r = run_extractor(input_path, output_path)
-        if r.returncode != 0:
-            mac_dialog("CommentHarvest – Error",
-                       f"Extractor failed.\n\nStdout:\n{r.stdout}\n\nStderr:\n{r.stderr}")
+        error = run_extractor(input_path, output_path)
+        if error:
+            mac_dialog("CommentHarvest – Error", f"Extractor failed.\n\n{error}")
             return
         try:
             subprocess.run(["open", str(output_path)], check=False)
@@ -1,14 +1,32 @@
 # src/extract_docx_comments.py
 import argparse
+import hashlib
+import json
+import os
 import zipfile
+from contextlib import contextmanager
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from lxml import etree as ET
-import pandas as pd
+
+# Optional SIMD inflate/CRC (zlib-ng, else isal); see _fast_zlib_for_reading()
+try:
+    from zlib_ng import zlib_ng as _fast_zlib
+except ImportError:
+    try:
+        from isal import isal_zlib as _fast_zlib
+    except ImportError:
+        _fast_zlib = None
 
 W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
 NS = {"w": W_NS}
 
+# Extracted rows are cached here, keyed by input path, mtime and size
+CACHE_DIR = Path.home() / ".cache" / "commentharvest"
+CACHE_MAX_ENTRIES = 64
+_CACHE_VERSION = 1
+
 def _qn(tag: str) -> str:
     # Qualify a WordprocessingML tag name, e.g. w:id
     if ":" in tag:
@@ -16,75 +34,225 @@ def _qn(tag: str) -> str:
         return "{%s}%s" % (NS[pfx], local)
     return tag
 
+# Qualified names used in the parsing loops, resolved once at import
+_W_T = _qn("w:t")
+_W_P = _qn("w:p")
+_W_ID = _qn("w:id")
+_W_CRS = _qn("w:commentRangeStart")
+_W_CRE = _qn("w:commentRangeEnd")
+_W_AUTHOR = _qn("w:author")
+_W_DATE = _qn("w:date")
+_W_COMMENT = _qn("w:comment")
+
+# Shared parser: no xml:id table, no entity expansion, no size limits for big documents
+_PARSER = ET.XMLParser(collect_ids=False, resolve_entities=False, huge_tree=True)
+
+@contextmanager
+def _fast_zlib_for_reading():
+    """
+    Point zipfile at zlib-ng/isal (if installed) for the duration of the block.
+    This is process-wide, so only wrap reads in a single-threaded CLI run; the
+    xlsx writers must run outside it (isal only supports compression levels 0-3).
+    """
+    if _fast_zlib is None:
+        yield
+        return
+    saved = zipfile.zlib, zipfile.crc32
+    zipfile.zlib, zipfile.crc32 = _fast_zlib, _fast_zlib.crc32
+    try:
+        yield
+    finally:
+        zipfile.zlib, zipfile.crc32 = saved
+
 def read_comments_xml(z: zipfile.ZipFile) -> Dict[int, dict]:
     """
     Parse word/comments.xml and return {id: {"text": str, "author": str|None, "date": str|None}}
     """
     try:
-        with z.open("word/comments.xml") as f:
-            root = ET.parse(f).getroot()
+        root = ET.fromstring(z.read("word/comments.xml"), _PARSER)
     except KeyError:
         # No comments part
         return {}
 
     comments: Dict[int, dict] = {}
-    for c in root.findall("w:comment", namespaces=NS):
-        cid = int(c.get(_qn("w:id")))
-        author = c.get(_qn("w:author"))
-        date = c.get(_qn("w:date"))
+    for c in root.findall(_W_COMMENT):
+        cid = int(c.get(_W_ID))
         # Concat all text nodes inside paragraphs/runs of this comment
-        texts: List[str] = []
-        for t in c.findall(".//w:t", namespaces=NS):
-            if t.text:
-                texts.append(t.text)
         comments[cid] = {
-            "text": "".join(texts).strip(),
-            "author": author,
-            "date": date,
+            "text": "".join(c.itertext(_W_T, with_tail=False)).strip(),
+            "author": c.get(_W_AUTHOR),
+            "date": c.get(_W_DATE),
         }
     return comments
 
-def read_commented_ranges(z: zipfile.ZipFile) -> Dict[int, str]:
+# Above this uncompressed size, stream document.xml instead of loading the whole tree
+STREAM_THRESHOLD = 32 * 1024 * 1024
+
+def _iter_range_elements(f):
     """
-    Walk word/document.xml in document order; collect text inside each comment range id.
-    Returns {id: commented_text}
+    Yield commentRangeStart/commentRangeEnd/w:t elements from an XML stream in
+    document order, freeing everything already consumed.
     """
-    with z.open("word/document.xml") as f:
-        root = ET.parse(f).getroot()
+    # Paragraph ends are only used to free finished paragraphs (and anything
+    # before them, e.g. tables), otherwise their shells pile up under w:body
+    context = ET.iterparse(
+        f, events=("start", "end"), tag=(_W_CRS, _W_CRE, _W_T, _W_P),
+        collect_ids=False, resolve_entities=False, huge_tree=True,
+    )
+    for event, elem in context:
+        tag = elem.tag
+        if event == "start":
+            # Range starts are empty, so they can be handled as soon as they open
+            if tag == _W_CRS:
+                yield elem
+            continue
+        # text is only complete on the end event
+        if tag == _W_T or tag == _W_CRE:
+            yield elem
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
 
-    open_ranges: Dict[int, List[str]] = {}
+def _collect_ranges(elems: Iterable, target_ids: Optional[Set[int]] = None) -> Dict[int, str]:
+    """
+    Consume range start/end and w:t elements in document order. If a comment id
+    has more than one range, the first one to close wins.
+    Returns {id: commented_text}
+    """
+    # Text seen while any range is open, plus each open range's start offset into it
+    all_text: List[str] = []
+    open_ranges: Dict[int, int] = {}
     collected: Dict[int, str] = {}
+    remaining = set(target_ids) if target_ids is not None else None
 
-    # Iterate in document order
-    for elem in root.iter():
+    for elem in elems:
         tag = elem.tag
         # comment range start
-        if tag == _qn("w:commentRangeStart"):
-            cid = int(elem.get(_qn("w:id")))
-            if cid not in open_ranges:
-                open_ranges[cid] = []
-        # text nodes
-        elif tag == _qn("w:t"):
-            text = elem.text or ""
+        if tag == _W_CRS:
+            cid = int(elem.get(_W_ID))
+            # an id whose range already closed keeps its first range
+            if cid not in open_ranges and cid not in collected:
+                open_ranges[cid] = len(all_text)
+        # text nodes, buffered once no matter how many ranges are open
+        elif tag == _W_T:
+            text = elem.text
             if text and open_ranges:
-                for cid in list(open_ranges.keys()):
-                    open_ranges[cid].append(text)
+                all_text.append(text)
         # comment range end
-        elif tag == _qn("w:commentRangeEnd"):
-            cid = int(elem.get(_qn("w:id")))
-            parts = open_ranges.pop(cid, [])
-            collected[cid] = "".join(parts).strip()
+        elif tag == _W_CRE:
+            cid = int(elem.get(_W_ID))
+            start = open_ranges.pop(cid, None)
+            if start is not None:
+                collected[cid] = "".join(all_text[start:]).strip()
+            if not open_ranges:
+                all_text.clear()
+            if start is not None and remaining is not None:
+                remaining.discard(cid)
+                if not remaining and not open_ranges:
+                    break
 
     return collected
 
-def extract_pairs(docx_path: Path) -> List[dict]:
+def read_commented_ranges(z: zipfile.ZipFile, target_ids: Optional[Set[int]] = None) -> Dict[int, str]:
+    """
+    Walk word/document.xml in document order; collect text inside each comment range id.
+    If target_ids is given, stop scanning once all of those ranges have closed.
+    Returns {id: commented_text}
+    """
+    if z.getinfo("word/document.xml").file_size > STREAM_THRESHOLD:
+        with z.open("word/document.xml") as f:
+            return _collect_ranges(_iter_range_elements(f), target_ids)
+
+    # Inflate in one go and hand lxml a single contiguous buffer
+    root = ET.fromstring(z.read("word/document.xml"), _PARSER)
+    # Tag filtering happens in C and the walk is lazy, so an early stop skips the rest
+    return _collect_ranges(root.iter(_W_CRS, _W_CRE, _W_T), target_ids)
+
+def _cache_path(docx_path: Path) -> Path:
+    # <path hash>-<state hash>.json, so older entries for the same file are easy to find
+    st = docx_path.stat()
+    path_key = hashlib.blake2b(str(docx_path.resolve()).encode(), digest_size=8).hexdigest()
+    state_key = hashlib.blake2b(
+        f"{_CACHE_VERSION}|{st.st_mtime_ns}|{st.st_size}".encode(), digest_size=8
+    ).hexdigest()
+    return CACHE_DIR / f"{path_key}-{state_key}.json"
+
+def _prune_cache(keep: Path) -> None:
+    """
+    Drop older entries for the same input file, then the least recently used
+    entries beyond CACHE_MAX_ENTRIES.
+    """
+    def mtime(p: Path) -> float:
+        try:
+            return p.stat().st_mtime
+        except OSError:
+            return 0.0
+
+    same_file = keep.name.split("-", 1)[0] + "-"
+    stale: List[Path] = []
+    others: List[Path] = []
+    for entry in keep.parent.glob("*.json"):
+        if entry == keep:
+            continue
+        (stale if entry.name.startswith(same_file) else others).append(entry)
+    others.sort(key=mtime)
+    stale += others[:max(len(others) + 1 - CACHE_MAX_ENTRIES, 0)]
+    for entry in stale:
+        try:
+            entry.unlink()
+        except OSError:
+            pass
+
+def extract_pairs(docx_path: Path, drop_empty: bool = True, use_cache: bool = True) -> List[dict]:
+    """
+    Pair each comment with its commented text. Results are cached on disk so
+    re-running on an unchanged file skips unzipping and parsing.
+    """
+    if not use_cache:
+        return _extract_pairs(docx_path, drop_empty)
+
+    # The cache holds every row; drop_empty is applied on the way out so
+    # toggling --keep-empty still hits it
+    cache_path = _cache_path(docx_path)
+    rows: Optional[List[dict]] = None
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            rows = json.load(f)
+        os.utime(cache_path)  # mark as recently used
+    except (OSError, ValueError):
+        # Missing or unreadable cache entry; fall through and rebuild it
+        pass
+
+    if rows is None:
+        rows = _extract_pairs(docx_path, drop_empty=False)
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(rows, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+            _prune_cache(cache_path)
+        except OSError:
+            # Caching is best-effort
+            pass
+
+    if drop_empty:
+        rows = [r for r in rows if r["Commented Text"]]
+    return rows
+
+def _extract_pairs(docx_path: Path, drop_empty: bool) -> List[dict]:
     with zipfile.ZipFile(docx_path) as z:
         comments_map = read_comments_xml(z)  # id -> {text, author, date}
-        ranges_map = read_commented_ranges(z)  # id -> commented_text
+        if not comments_map:
+            # Nothing to pair, skip parsing the document body
+            return []
+        ranges_map = read_commented_ranges(z, set(comments_map))  # id -> commented_text
 
     rows: List[dict] = []
     for cid, cmeta in comments_map.items():
         commented_text = ranges_map.get(cid, "")
+        if drop_empty and not commented_text:
+            continue
         rows.append({
             "id": cid,
             "Commented Text": commented_text,
@@ -94,6 +262,49 @@ def extract_pairs(docx_path: Path) -> List[dict]:
         })
     return rows
 
+# Excel's per-cell character limit; longer text is clipped rather than dropped
+EXCEL_MAX_CELL_CHARS = 32767
+
+def _cell_text(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    return value[:EXCEL_MAX_CELL_CHARS]
+
+def write_xlsx(rows: List[dict], out_path: Path, author: bool = False, date: bool = False) -> None:
+    """
+    Write extracted rows to an .xlsx with Commented Text, Comment and the optional Author/Date columns.
+    """
+    # Requested columns
+    base_cols = ["Commented Text", "Comment"]
+    if author:
+        base_cols.append("Author")
+    if date:
+        base_cols.append("Date")
+
+    # Project every row onto the requested columns in one C call
+    project = itemgetter(*base_cols)
+
+    # Deferred so --help and failed extractions don't pay for it
+    import xlsxwriter
+
+    # Write to Excel, streaming rows straight to disk. Every value is written as
+    # plain text (no auto hyperlinks/formulas), cell by cell, so one cell can't
+    # cut the rest of its row short the way write_row() does on error.
+    wb = xlsxwriter.Workbook(str(out_path), {
+        "constant_memory": True,
+        "strings_to_urls": False,
+        "strings_to_formulas": False,
+    })
+    ws = wb.add_worksheet()
+    for col_i, name in enumerate(base_cols):
+        ws.write_string(0, col_i, name)
+    for row_i, r in enumerate(rows, start=1):
+        for col_i, value in enumerate(project(r)):
+            value = _cell_text(value)
+            if value is not None:
+                ws.write_string(row_i, col_i, value)
+    wb.close()
+
 def main():
     parser = argparse.ArgumentParser(
         description="Export Word (.docx) comments to Excel: (Commented Text, Comment)."
@@ -103,32 +314,20 @@ def main():
     parser.add_argument("--author", action="store_true", help="Include Author column")
     parser.add_argument("--date", action="store_true", help="Include Date column")
     parser.add_argument("--keep-empty", action="store_true", help="Keep rows with empty commented text")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and don't update the extraction cache")
 
     args = parser.parse_args()
     docx_path = Path(args.input)
     if not docx_path.exists():
         raise SystemExit(f"Input not found: {docx_path}")
 
-    rows = extract_pairs(docx_path)
+    with _fast_zlib_for_reading():
+        rows = extract_pairs(docx_path, drop_empty=not args.keep_empty, use_cache=not args.no_cache)
 
     # Default output path
     out_path = Path(args.output) if args.output else docx_path.with_suffix(".xlsx")
 
-    # Build DataFrame with requested columns
-    base_cols = ["Commented Text", "Comment"]
-    if args.author:
-        base_cols.append("Author")
-    if args.date:
-        base_cols.append("Date")
-
-    df = pd.DataFrame(rows)
-    if not args.keep_empty:
-        df = df[df["Commented Text"].astype(str).str.strip() != ""]
-
-    df = df[base_cols]
-
-    # Write to Excel
-    df.to_excel(out_path, index=False)
+    write_xlsx(rows, out_path, author=args.author, date=args.date)
     print(f"Wrote: {out_path}")
 
 if __name__ == "__main__":
@@ -0,0 +1,256 @@
+import zipfile
+
+import pytest
+
+import src.extract_docx_comments as edc
+
+W_DECL = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+
+def make_docx(path, body, comments=None):
+    """Write a minimal .docx with the given w:body XML and {id: text} comments."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("word/document.xml", f"<w:document {W_DECL}><w:body>{body}</w:body></w:document>")
+        if comments is not None:
+            parts = "".join(
+                f'<w:comment w:id="{cid}" w:author="A{cid}"><w:p><w:r><w:t>{text}</w:t></w:r></w:p></w:comment>'
+                for cid, text in comments.items()
+            )
+            z.writestr("word/comments.xml", f"<w:comments {W_DECL}>{parts}</w:comments>")
+    return path
+
+
+def p(*runs):
+    return "<w:p><w:pPr/>" + "".join(runs) + "</w:p>"
+
+
+def r(text):
+    return f"<w:r><w:rPr><w:b/></w:rPr><w:t>{text}</w:t></w:r>"
+
+
+def crs(cid):
+    return f'<w:commentRangeStart w:id="{cid}"/>'
+
+
+def cre(cid):
+    return f'<w:commentRangeEnd w:id="{cid}"/>'
+
+
+# Overlapping ranges, a range spanning paragraphs and a table, and trailing content
+BODY = (
+    p(r("Intro "), crs(0), r("hello "), crs(1), r("world"), cre(0), r(" more"))
+    + "<w:tbl><w:tr><w:tc><w:tcPr/>" + p(r(" cell")) + "</w:tc></w:tr></w:tbl>"
+    + p(r(" after"), cre(1), r(" tail"))
+    + p(crs(2), cre(2), r("outside"))
+    + p(r("x " * 50))
+)
+COMMENTS = {0: "First", 1: "Second", 2: "Empty range"}
+EXPECTED = {0: "hello world", 1: "world more cell after", 2: ""}
+
+
+@pytest.fixture
+def docx(tmp_path):
+    return make_docx(tmp_path / "t.docx", BODY, COMMENTS)
+
+
+@pytest.mark.parametrize("threshold", [0, 32 * 1024 * 1024])
+def test_read_commented_ranges_stream_and_tree(docx, monkeypatch, threshold):
+    monkeypatch.setattr(edc, "STREAM_THRESHOLD", threshold)
+    with zipfile.ZipFile(docx) as z:
+        assert edc.read_commented_ranges(z) == EXPECTED
+        assert edc.read_commented_ranges(z, set(COMMENTS)) == EXPECTED
+
+
+def test_stream_frees_finished_paragraphs(docx):
+    with zipfile.ZipFile(docx) as z, z.open("word/document.xml") as f:
+        for elem in edc._iter_range_elements(f):
+            if elem.tag == edc._W_CRS and elem.get(edc._W_ID) == "2":
+                # Only the just-finished paragraph is left before this one, and it
+                # has been emptied; the first paragraph and the table are gone
+                prev = elem.getparent().getprevious()
+                assert len(prev) == 0
+                assert prev.getprevious() is None
+                break
+        else:
+            pytest.fail("range 2 start not reached")
+
+
+@pytest.mark.parametrize("threshold", [0, 32 * 1024 * 1024])
+def test_repeated_range_id_keeps_first_range(tmp_path, monkeypatch, threshold):
+    monkeypatch.setattr(edc, "STREAM_THRESHOLD", threshold)
+    body = p(crs(0), r("a"), cre(0), r("b"), crs(0), r("c"), cre(0), cre(5))
+    path = make_docx(tmp_path / "dup.docx", body, {0: "c0"})
+    with zipfile.ZipFile(path) as z:
+        # Same answer whether or not the scan may stop early
+        assert edc.read_commented_ranges(z) == {0: "a"}
+        assert edc.read_commented_ranges(z, {0}) == {0: "a"}
+
+
+X_NS = {"x": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+def read_sheet(path):
+    """Return ({cell ref: (kind, text)}, has_hyperlinks) for the first worksheet."""
+    from lxml import etree as ET
+
+    with zipfile.ZipFile(path) as z:
+        shared = []
+        if "xl/sharedStrings.xml" in z.namelist():
+            sst = ET.fromstring(z.read("xl/sharedStrings.xml"))
+            shared = ["".join(si.itertext()) for si in sst.iterfind("x:si", X_NS)]
+        sheet = ET.fromstring(z.read("xl/worksheets/sheet1.xml"))
+    cells = {}
+    for c in sheet.iterfind(".//x:c", X_NS):
+        f = c.find("x:f", X_NS)
+        if f is not None:
+            cells[c.get("r")] = ("formula", f.text)
+        elif c.get("t") == "inlineStr":
+            cells[c.get("r")] = ("str", "".join(c.find("x:is", X_NS).itertext()))
+        elif c.get("t") == "s":
+            cells[c.get("r")] = ("str", shared[int(c.find("x:v", X_NS).text)])
+        elif c.find("x:v", X_NS) is not None:
+            cells[c.get("r")] = ("value", c.find("x:v", X_NS).text)
+    return cells, sheet.find(".//x:hyperlinks", X_NS) is not None
+
+
+def row(text, comment="note", author="Ann", date=None):
+    return {"id": 0, "Commented Text": text, "Comment": comment, "Author": author, "Date": date}
+
+
+# Values an eager writer would turn into links/formulas or choke on
+TRICKY_ROWS = [
+    row("https://example.com/" + "a" * 2100),
+    row("x" * 40000, comment="after long text"),
+    row("mailto:someone@example.com"),
+    row("=SUM(A1:A2)"),
+    row("plain", author=None, date="2024-01-01T00:00:00Z"),
+]
+
+
+def test_write_xlsx_keeps_plain_text(tmp_path):
+    out = tmp_path / "out.xlsx"
+    edc.write_xlsx(TRICKY_ROWS, out, author=True, date=True)
+    cells, has_links = read_sheet(out)
+
+    assert not has_links
+    assert cells["A1"] == ("str", "Commented Text")
+    assert cells["A2"] == ("str", TRICKY_ROWS[0]["Commented Text"])
+    assert cells["B2"] == ("str", "note")
+    assert cells["A3"] == ("str", "x" * edc.EXCEL_MAX_CELL_CHARS)
+    assert cells["B3"] == ("str", "after long text")
+    assert cells["C3"] == ("str", "Ann")
+    assert cells["A4"] == ("str", "mailto:someone@example.com")
+    assert cells["A5"] == ("str", "=SUM(A1:A2)")
+    assert "C6" not in cells
+    assert cells["D6"] == ("str", "2024-01-01T00:00:00Z")
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    d = tmp_path / "cache"
+    monkeypatch.setattr(edc, "CACHE_DIR", d)
+    return d
+
+
+def test_cache_shared_across_keep_empty(docx, cache_dir, monkeypatch):
+    assert [r["id"] for r in edc.extract_pairs(docx)] == [0, 1]
+    assert len(list(cache_dir.glob("*.json"))) == 1
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError("cache miss")
+
+    monkeypatch.setattr(edc, "_extract_pairs", no_parse)
+    assert [r["id"] for r in edc.extract_pairs(docx, drop_empty=False)] == [0, 1, 2]
+    assert [r["id"] for r in edc.extract_pairs(docx)] == [0, 1]
+    assert len(list(cache_dir.glob("*.json"))) == 1
+
+
+def test_cache_replaces_stale_entries_and_is_capped(tmp_path, docx, cache_dir, monkeypatch):
+    edc.extract_pairs(docx)
+    first = set(cache_dir.glob("*.json"))
+    make_docx(docx, BODY + p(r("edited")), COMMENTS)
+    edc.extract_pairs(docx)
+    second = set(cache_dir.glob("*.json"))
+    assert len(second) == 1 and second != first
+
+    monkeypatch.setattr(edc, "CACHE_MAX_ENTRIES", 3)
+    for i in range(5):
+        edc.extract_pairs(make_docx(tmp_path / f"d{i}.docx", BODY, COMMENTS))
+    assert len(list(cache_dir.glob("*.json"))) == 3
+
+
+def test_fast_zlib_only_patched_while_reading(docx, tmp_path, monkeypatch):
+    import types
+    import zlib
+
+    fake = types.SimpleNamespace(**{k: getattr(zlib, k) for k in dir(zlib) if not k.startswith("__")})
+    monkeypatch.setattr(edc, "_fast_zlib", fake)
+    seen = {}
+
+    def spy_extract(*args, **kwargs):
+        seen["read"] = zipfile.zlib
+        return [row("text")]
+
+    def spy_write(*args, **kwargs):
+        seen["write"] = zipfile.zlib
+
+    monkeypatch.setattr(edc, "extract_pairs", spy_extract)
+    monkeypatch.setattr(edc, "write_xlsx", spy_write)
+    monkeypatch.setattr("sys.argv", ["prog", str(docx), "-o", str(tmp_path / "o.xlsx")])
+
+    assert zipfile.zlib is zlib
+    edc.main()
+    assert seen == {"read": fake, "write": zlib}
+    assert zipfile.zlib is zlib and zipfile.crc32 is zlib.crc32
+
+
+
+def test_read_comments_xml_text_author_date(tmp_path):
+    comments = f"""<w:comments {W_DECL}>
+  <w:comment w:id="7" w:author="Ann" w:date="2024-01-01T00:00:00Z">
+    <w:p>
+      <w:r>
+        <w:t xml:space="preserve">Please </w:t>
+      </w:r>
+      <w:del><w:r><w:delText>do not </w:delText></w:r></w:del>
+      <w:r>
+        <w:t>check</w:t>
+      </w:r>
+    </w:p>
+    <w:p>
+      <w:r><w:t xml:space="preserve"> this.</w:t></w:r>
+    </w:p>
+  </w:comment>
+  <w:comment w:id="8"><w:p><w:r><w:t>  </w:t></w:r></w:p></w:comment>
+</w:comments>"""
+    path = tmp_path / "c.docx"
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("word/comments.xml", comments)
+    with zipfile.ZipFile(path) as z:
+        # Runs are joined without the pretty-printing tails and without deleted text
+        assert edc.read_comments_xml(z) == {
+            7: {"text": "Please check this.", "author": "Ann", "date": "2024-01-01T00:00:00Z"},
+            8: {"text": "", "author": None, "date": None},
+        }
+
+
+@pytest.mark.parametrize("comments", [None, {}])
+def test_extract_pairs_without_comments_skips_document(tmp_path, monkeypatch, comments):
+    path = make_docx(tmp_path / "none.docx", BODY, comments)
+
+    def no_scan(*args, **kwargs):
+        raise AssertionError("document.xml was read")
+
+    monkeypatch.setattr(edc, "read_commented_ranges", no_scan)
+    assert edc.extract_pairs(path, use_cache=False) == []
+    assert edc.extract_pairs(path, drop_empty=False, use_cache=False) == []
+
+
+def test_cache_round_trips_rows_and_survives_corruption(docx, cache_dir):
+    fresh = edc.extract_pairs(docx, drop_empty=False, use_cache=False)
+    assert edc.extract_pairs(docx, drop_empty=False) == fresh
+    assert edc.extract_pairs(docx, drop_empty=False) == fresh  # served from the cache
+
+    (entry,) = cache_dir.glob("*.json")
+    entry.write_text("{not json", encoding="utf-8")
+    assert edc.extract_pairs(docx, drop_empty=False) == fresh